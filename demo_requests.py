@@ -4,233 +4,257 @@ Comprehensive POST request demonstrations for OTA Agent testing.
 Run this after starting the server to test various scenarios.
 """
 
-import requests
-import json
-import time
+import asyncio
+import httpx
+import orjson
 
 BASE_URL = "http://localhost:5001"
 
-def make_request(payload, description):
+# Agent runs in flight at once; more just queue behind the server's LLM rate limit
+MAX_IN_FLIGHT = 4
+
+async def make_request(client, body, payload, description):
     """Helper function to make POST requests with consistent formatting."""
-    print(f"\n{'='*60}")
-    print(f"TEST: {description}")
-    print(f"{'='*60}")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
+    # Build the report first and print it in one go so concurrent
+    # requests don't interleave their output.
+    lines = [
+        f"\n{'='*60}",
+        f"TEST: {description}",
+        f"{'='*60}",
+        f"Payload: {orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()}",
+    ]
     
     try:
-        response = requests.post(
-            f"{BASE_URL}/trigger-agent",
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        print(f"\nStatus Code: {response.status_code}")
-        print(f"Response: {json.dumps(response.json(), indent=2)}")
+        response = await client.post("/trigger-agent", content=body)
+        lines.append(f"\nStatus Code: {response.status_code}")
+        result = orjson.loads(response.content)
+        lines.append(f"Response: {orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()}")
         return response.status_code == 200
     except Exception as e:
-        print(f"Request failed: {e}")
+        lines.append(f"Request failed: {e}")
         return False
+    finally:
+        print("\n".join(lines))
 
 def demo_sensor_threshold_scenarios():
     """Test various sensor threshold scenarios."""
+    return [
+        # Temperature threshold exceeded
+        ({
+            "device_id": "device-001",
+            "event_details": "sensor_A_threshold_exceeded",
+            "policy": "When sensor A exceeds threshold, activate sensor B monitoring"
+        }, "Temperature Sensor Threshold Exceeded"),
+    
+        # Multiple sensor activation
+        ({
+            "device_id": "device-001", 
+            "event_details": "multiple_sensors_active",
+            "policy": "When multiple sensors are active, optimize power consumption by reducing sampling frequency"
+        }, "Multiple Sensors Active - Power Optimization"),
     
-    # Temperature threshold exceeded
-    make_request({
-        "device_id": "device-001",
-        "event_details": "sensor_A_threshold_exceeded",
-        "policy": "When sensor A exceeds threshold, activate sensor B monitoring"
-    }, "Temperature Sensor Threshold Exceeded")
-    
-    # Multiple sensor activation
-    make_request({
-        "device_id": "device-001", 
-        "event_details": "multiple_sensors_active",
-        "policy": "When multiple sensors are active, optimize power consumption by reducing sampling frequency"
-    }, "Multiple Sensors Active - Power Optimization")
-    
-    # Critical temperature alert
-    make_request({
-        "device_id": "device-001",
-        "event_details": "sensor_A_critical_temperature_85C",
-        "policy": "When temperature exceeds 85°C, immediately activate cooling protocol and reduce CPU frequency"
-    }, "Critical Temperature Alert")
+        # Critical temperature alert
+        ({
+            "device_id": "device-001",
+            "event_details": "sensor_A_critical_temperature_85C",
+            "policy": "When temperature exceeds 85°C, immediately activate cooling protocol and reduce CPU frequency"
+        }, "Critical Temperature Alert"),
+    ]
 
 def demo_environmental_scenarios():
     """Test environmental monitoring scenarios."""
+    return [
+        # Low light conditions
+        ({
+            "device_id": "device-001",
+            "event_details": "sensor_D_low_light_detected",
+            "policy": "When light intensity drops below 10 lux, switch to night mode and activate motion sensor"
+        }, "Low Light Detection - Night Mode"),
     
-    # Low light conditions
-    make_request({
-        "device_id": "device-001",
-        "event_details": "sensor_D_low_light_detected",
-        "policy": "When light intensity drops below 10 lux, switch to night mode and activate motion sensor"
-    }, "Low Light Detection - Night Mode")
-    
-    # High pressure system
-    make_request({
-        "device_id": "device-001",
-        "event_details": "sensor_C_pressure_spike_detected",
-        "policy": "When pressure increases rapidly, log GPS coordinates and increase sensor sampling rate"
-    }, "Pressure Spike Detection")
-    
-    # Motion detection
-    make_request({
-        "device_id": "device-001",
-        "event_details": "sensor_E_motion_detected",
-        "policy": "When motion is detected, activate all sensors for 30 seconds then return to normal mode"
-    }, "Motion Detection - Full Sensor Activation")
+        # High pressure system
+        ({
+            "device_id": "device-001",
+            "event_details": "sensor_C_pressure_spike_detected",
+            "policy": "When pressure increases rapidly, log GPS coordinates and increase sensor sampling rate"
+        }, "Pressure Spike Detection"),
+    
+        # Motion detection
+        ({
+            "device_id": "device-001",
+            "event_details": "sensor_E_motion_detected",
+            "policy": "When motion is detected, activate all sensors for 30 seconds then return to normal mode"
+        }, "Motion Detection - Full Sensor Activation"),
+    ]
 
 def demo_power_management_scenarios():
     """Test power management scenarios."""
+    return [
+        # Low battery
+        ({
+            "device_id": "device-001",
+            "event_details": "battery_level_15_percent",
+            "policy": "When battery drops below 20%, disable non-essential sensors and reduce transmission frequency"
+        }, "Low Battery - Power Conservation"),
+    
+        # Sleep mode request
+        ({
+            "device_id": "device-001",
+            "event_details": "scheduled_sleep_mode",
+            "policy": "Enter deep sleep mode from 2AM to 6AM, wake only for critical alerts"
+        }, "Scheduled Sleep Mode"),
     
-    # Low battery
-    make_request({
-        "device_id": "device-001",
-        "event_details": "battery_level_15_percent",
-        "policy": "When battery drops below 20%, disable non-essential sensors and reduce transmission frequency"
-    }, "Low Battery - Power Conservation")
-    
-    # Sleep mode request
-    make_request({
-        "device_id": "device-001",
-        "event_details": "scheduled_sleep_mode",
-        "policy": "Enter deep sleep mode from 2AM to 6AM, wake only for critical alerts"
-    }, "Scheduled Sleep Mode")
-    
-    # Solar charging detected
-    make_request({
-        "device_id": "device-001",
-        "event_details": "solar_charging_active",
-        "policy": "When solar charging is active, increase sensor sampling and enable all monitoring features"
-    }, "Solar Charging - Enhanced Monitoring")
+        # Solar charging detected
+        ({
+            "device_id": "device-001",
+            "event_details": "solar_charging_active",
+            "policy": "When solar charging is active, increase sensor sampling and enable all monitoring features"
+        }, "Solar Charging - Enhanced Monitoring"),
+    ]
 
 def demo_connectivity_scenarios():
     """Test connectivity and communication scenarios."""
+    return [
+        # WiFi connection lost
+        ({
+            "device_id": "device-001",
+            "event_details": "wifi_connection_lost",
+            "policy": "When WiFi is lost, store data locally and attempt reconnection every 5 minutes"
+        }, "WiFi Connection Lost"),
     
-    # WiFi connection lost
-    make_request({
-        "device_id": "device-001",
-        "event_details": "wifi_connection_lost",
-        "policy": "When WiFi is lost, store data locally and attempt reconnection every 5 minutes"
-    }, "WiFi Connection Lost")
-    
-    # Firmware update available
-    make_request({
-        "device_id": "device-001",
-        "event_details": "firmware_update_available_v2.1",
-        "policy": "When firmware update is available, download during low activity hours and verify integrity"
-    }, "Firmware Update Available")
-    
-    # Network congestion
-    make_request({
-        "device_id": "device-001",
-        "event_details": "network_congestion_detected",
-        "policy": "When network congestion is high, reduce data transmission frequency and compress sensor data"
-    }, "Network Congestion - Data Optimization")
+        # Firmware update available
+        ({
+            "device_id": "device-001",
+            "event_details": "firmware_update_available_v2.1",
+            "policy": "When firmware update is available, download during low activity hours and verify integrity"
+        }, "Firmware Update Available"),
+    
+        # Network congestion
+        ({
+            "device_id": "device-001",
+            "event_details": "network_congestion_detected",
+            "policy": "When network congestion is high, reduce data transmission frequency and compress sensor data"
+        }, "Network Congestion - Data Optimization"),
+    ]
 
 def demo_security_scenarios():
     """Test security-related scenarios."""
+    return [
+        # Unauthorized access attempt
+        ({
+            "device_id": "device-001",
+            "event_details": "unauthorized_access_attempt",
+            "policy": "When unauthorized access is detected, lock device, log incident, and alert administrator"
+        }, "Security Alert - Unauthorized Access"),
     
-    # Unauthorized access attempt
-    make_request({
-        "device_id": "device-001",
-        "event_details": "unauthorized_access_attempt",
-        "policy": "When unauthorized access is detected, lock device, log incident, and alert administrator"
-    }, "Security Alert - Unauthorized Access")
-    
-    # Tamper detection
-    make_request({
-        "device_id": "device-001",
-        "event_details": "physical_tamper_detected",
-        "policy": "When physical tampering is detected, immediately backup critical data and enter secure mode"
-    }, "Physical Tamper Detection")
+        # Tamper detection
+        ({
+            "device_id": "device-001",
+            "event_details": "physical_tamper_detected",
+            "policy": "When physical tampering is detected, immediately backup critical data and enter secure mode"
+        }, "Physical Tamper Detection"),
+    ]
 
 def demo_maintenance_scenarios():
     """Test maintenance and diagnostic scenarios."""
+    return [
+        # Sensor calibration needed
+        ({
+            "device_id": "device-001",
+            "event_details": "sensor_calibration_due",
+            "policy": "When sensors need calibration, run self-diagnostic routine and adjust readings based on reference values"
+        }, "Sensor Calibration Required"),
+    
+        # Memory usage high
+        ({
+            "device_id": "device-001",
+            "event_details": "memory_usage_85_percent",
+            "policy": "When memory usage exceeds 80%, clear old logs, compress data, and optimize memory allocation"
+        }, "High Memory Usage - Cleanup"),
     
-    # Sensor calibration needed
-    make_request({
-        "device_id": "device-001",
-        "event_details": "sensor_calibration_due",
-        "policy": "When sensors need calibration, run self-diagnostic routine and adjust readings based on reference values"
-    }, "Sensor Calibration Required")
-    
-    # Memory usage high
-    make_request({
-        "device_id": "device-001",
-        "event_details": "memory_usage_85_percent",
-        "policy": "When memory usage exceeds 80%, clear old logs, compress data, and optimize memory allocation"
-    }, "High Memory Usage - Cleanup")
-    
-    # System health check
-    make_request({
-        "device_id": "device-001",
-        "event_details": "scheduled_health_check",
-        "policy": "Perform comprehensive system health check including sensor validation, memory test, and connectivity verification"
-    }, "Scheduled System Health Check")
+        # System health check
+        ({
+            "device_id": "device-001",
+            "event_details": "scheduled_health_check",
+            "policy": "Perform comprehensive system health check including sensor validation, memory test, and connectivity verification"
+        }, "Scheduled System Health Check"),
+    ]
 
 def demo_edge_cases():
     """Test edge cases and error scenarios."""
+    return [
+        # Invalid sensor reading
+        ({
+            "device_id": "device-001",
+            "event_details": "sensor_A_invalid_reading_-999",
+            "policy": "When sensor returns invalid reading, attempt recalibration, if failed switch to backup sensor"
+        }, "Invalid Sensor Reading"),
     
-    # Invalid sensor reading
-    make_request({
-        "device_id": "device-001",
-        "event_details": "sensor_A_invalid_reading_-999",
-        "policy": "When sensor returns invalid reading, attempt recalibration, if failed switch to backup sensor"
-    }, "Invalid Sensor Reading")
-    
-    # Multiple simultaneous events
-    make_request({
-        "device_id": "device-001",
-        "event_details": "multiple_events: temperature_high, motion_detected, low_battery",
-        "policy": "When multiple critical events occur simultaneously, prioritize safety protocols and emergency data transmission"
-    }, "Multiple Simultaneous Critical Events")
-    
-    # Unknown device ID
-    make_request({
-        "device_id": "device-999",
-        "event_details": "unknown_device_registration",
-        "policy": "When unknown device attempts registration, verify credentials and initialize with default configuration"
-    }, "Unknown Device Registration")
+        # Multiple simultaneous events
+        ({
+            "device_id": "device-001",
+            "event_details": "multiple_events: temperature_high, motion_detected, low_battery",
+            "policy": "When multiple critical events occur simultaneously, prioritize safety protocols and emergency data transmission"
+        }, "Multiple Simultaneous Critical Events"),
+    
+        # Unknown device ID
+        ({
+            "device_id": "device-999",
+            "event_details": "unknown_device_registration",
+            "policy": "When unknown device attempts registration, verify credentials and initialize with default configuration"
+        }, "Unknown Device Registration"),
+    ]
 
-def run_all_demos():
+# All demo cases, with request bodies serialized once at import
+CASES = (
+    demo_sensor_threshold_scenarios()
+    + demo_environmental_scenarios()
+    + demo_power_management_scenarios()
+    + demo_connectivity_scenarios()
+    + demo_security_scenarios()
+    + demo_maintenance_scenarios()
+    + demo_edge_cases()
+)
+SERIALIZED = [(orjson.dumps(p), p, desc) for p, desc in CASES]
+
+async def run_all_demos():
     """Run all demonstration scenarios."""
-    print("🚀 Starting OTA Agent POST Request Demonstrations")
-    print("Make sure the server is running: python run.py")
+    async with httpx.AsyncClient(
+        base_url=BASE_URL,
+        # Agent runs can queue behind the LLM rate limit for minutes
+        timeout=None,
+        headers={"Content-Type": "application/json"},
+        limits=httpx.Limits(max_keepalive_connections=16),
+    ) as client:
+        print("🚀 Starting OTA Agent POST Request Demonstrations")
+        print("Make sure the server is running: python run.py")
     
-    # Check if server is running
-    try:
-        health_response = requests.get(f"{BASE_URL}/health")
-        if health_response.status_code != 200:
-            print("❌ Server health check failed!")
+        # Check if server is running
+        try:
+            health_response = await client.get("/health", timeout=5)
+            if health_response.status_code != 200:
+                print("❌ Server health check failed!")
+                return
+        except:
+            print("❌ Cannot connect to server. Make sure it's running on port 5001")
             return
-    except:
-        print("❌ Cannot connect to server. Make sure it's running on port 5001")
-        return
-    
-    print("✅ Server is running, starting demonstrations...\n")
-    
-    demo_sensor_threshold_scenarios()
-    time.sleep(1)
-    
-    demo_environmental_scenarios()
-    time.sleep(1)
-    
-    demo_power_management_scenarios()
-    time.sleep(1)
     
-    demo_connectivity_scenarios()
-    time.sleep(1)
+        print("✅ Server is running, starting demonstrations...\n")
     
-    demo_security_scenarios()
-    time.sleep(1)
+        # The requests are independent, so run up to MAX_IN_FLIGHT at a time
+        semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
     
-    demo_maintenance_scenarios()
-    time.sleep(1)
+        async def bounded(body, payload, description):
+            async with semaphore:
+                return await make_request(client, body, payload, description)
     
-    demo_edge_cases()
+        await asyncio.gather(*[
+            bounded(body, payload, description)
+            for body, payload, description in SERIALIZED
+        ])
     
-    print(f"\n{'='*60}")
-    print("🎉 All demonstrations completed!")
-    print(f"{'='*60}")
+        print(f"\n{'='*60}")
+        print("🎉 All demonstrations completed!")
+        print(f"{'='*60}")
 
 if __name__ == "__main__":
-    run_all_demos()
\ No newline at end of file
+    asyncio.run(run_all_demos())
\ No newline at end of file
@@ -4,7 +4,16 @@ __version__ = "1.0.1"
 
 from .config import Config
 from .database import DeviceDatabase
-from .agent import FirmwareAgent
-from .app import create_app
 
-__all__ = ['Config', 'DeviceDatabase', 'FirmwareAgent', 'create_app']
\ No newline at end of file
+__all__ = ['Config', 'DeviceDatabase', 'FirmwareAgent', 'create_app']
+
+
+def __getattr__(name):
+    """Import the LangChain-backed exports on first access (PEP 562)."""
+    if name == 'FirmwareAgent':
+        from .agent import FirmwareAgent
+        return FirmwareAgent
+    if name == 'create_app':
+        from .app import create_app
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
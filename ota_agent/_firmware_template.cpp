@@ -0,0 +1,44 @@
+// Firmware Version: 1.0
+// Description: Initial firmware that monitors sensors A, C, D based on device schema
+#include <Arduino.h>
+
+// --- Pin Definitions (based on sensor_schema)
+#define SENSOR_A_PIN 1  // temperature
+#define SENSOR_C_PIN 3  // pressure  
+#define SENSOR_D_PIN 4  // light_intensity
+
+// --- Configuration ---
+const int SENSOR_A_THRESHOLD = 100;
+
+void setup() {
+    Serial.begin(115200);
+    while (!Serial);
+    Serial.println("============================");
+    Serial.println("Device starting... Firmware v1.0");
+    Serial.println("Mode: Monitoring Sensors A, C, D");
+    Serial.println("============================");
+    
+    pinMode(SENSOR_A_PIN, INPUT);
+    pinMode(SENSOR_C_PIN, INPUT);
+    pinMode(SENSOR_D_PIN, INPUT);
+}
+
+void loop() {
+    int sensor_a_value = analogRead(SENSOR_A_PIN);
+    int sensor_c_value = analogRead(SENSOR_C_PIN);
+    int sensor_d_value = analogRead(SENSOR_D_PIN);
+
+    Serial.print("DATA: Sensor A (temperature): ");
+    Serial.println(sensor_a_value);
+    Serial.print("DATA: Sensor C (pressure): ");
+    Serial.println(sensor_c_value);
+    Serial.print("DATA: Sensor D (light_intensity): ");
+    Serial.println(sensor_d_value);
+
+    if (sensor_a_value > SENSOR_A_THRESHOLD) {
+        Serial.println("EVENT: sensor_A_threshold_exceeded");
+    }
+
+    Serial.println("---");
+    delay(5000);
+}
@@ -1,8 +1,96 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, ToolMessage
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+import httpx
+from langchain_core.messages import (
+    BaseMessage, HumanMessage, SystemMessage, ToolMessage, message_chunk_to_message
+)
 from .config import Config
-from .tools import get_all_tools
+from .rate_limit import TokenBucket
+from .tools import get_all_tools, get_device_context
+
+
+log = logging.getLogger(__name__)
+
+# Pooled HTTP clients shared by every FirmwareAgent in the process, so LLM
+# calls reuse warm keep-alive (and TLS) connections to the OpenAI API.
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, keepalive_expiry=30)
+_HTTP_CLIENT = httpx.Client(http2=True, limits=_HTTP_LIMITS, timeout=60)
+_HTTP_ASYNC_CLIENT = httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS, timeout=60)
+
+# Client-side throttle on LLM requests, so bursts queue here for a few
+# milliseconds instead of being rejected with 429s and retried with backoff.
+# The budget is per process: this module can't know how many workers the
+# process manager (uvicorn --workers, gunicorn -w) actually started.
+_LLM_LIMITER = (
+    TokenBucket(rate=Config.LLM_MAX_RPM_PER_WORKER / 60, capacity=5)
+    if Config.LLM_MAX_RPM_PER_WORKER > 0 else None
+)
+
+
+# Prompt templates for create_agent_prompt, built once at import
+_POLICY_TEMPLATE = """
+You have received a runtime event from device '{device_id}'.
+Event: '{event_details}'
+Policy: '{policy}'
+
+Follow these steps:
+1. Use 'get_device_state_tool' to understand the device configuration.
+2. Use 'read_current_firmware' to inspect the existing code.
+3. Rewrite the *entire firmware* in C++/Arduino format to implement the policy.
+4. Use 'write_new_firmware' to save the code.
+5. Use 'trigger_ota_flash' to simulate deployment.
+
+Steps 1 and 2 are independent: request both tool calls in the same response.
+"""
+
+_AUTONOMOUS_TEMPLATE = """
+You have received a runtime event from device '{device_id}'.
+Event: '{event_details}'
+
+As an autonomous IoT firmware engineer, analyze this event and determine the optimal response.
+
+Consider these factors in your decision-making:
+1. **Device Safety**: Prevent damage, overheating, or malfunction
+2. **Power Efficiency**: Optimize battery life and energy consumption
+3. **Sensor Optimization**: Improve data quality and reliability
+4. **Network Management**: Handle connectivity issues intelligently
+5. **Security**: Protect against tampering and unauthorized access
+6. **Performance**: Balance responsiveness with resource constraints
+
+Follow these steps:
+1. Use 'get_device_state_tool' to understand the device configuration and available sensors
+2. Use 'read_current_firmware' to inspect the existing code and understand current behavior
+3. Analyze the event and determine the best firmware modifications based on:
+   - IoT industry best practices
+   - Arduino/embedded systems optimization techniques
+   - Sensor management strategies
+   - Power management principles
+   - Safety and reliability requirements
+4. Rewrite the *entire firmware* with your intelligent modifications
+5. Use 'write_new_firmware' to save the optimized code with detailed comments explaining your decisions
+6. Use 'trigger_ota_flash' to deploy the update
+
+Steps 1 and 2 are independent: request both tool calls in the same response.
+Make autonomous decisions that demonstrate your expertise in IoT firmware engineering.
+Include detailed comments in your code explaining why you made each decision.
+"""
+
+# Appended when the device's state and firmware are read up front, saving the
+# LLM round trips it would otherwise spend calling the two read tools
+_CONTEXT_TEMPLATE = """
+The results of steps 1 and 2 are already included below, so skip those tool
+calls unless you need a fresh read, and continue from the next step.
+
+Device state ('get_device_state_tool'):
+{device_state}
+
+Current firmware ('read_current_firmware'):
+```cpp
+{current_code}
+```
+"""
 
 
 class FirmwareAgent:
@@ -17,112 +105,173 @@ class FirmwareAgent:
         "Always generate complete, compilable Arduino C++ code with detailed comments explaining your decisions."
     )
     
-    def __init__(self, max_iterations: int = 10):
+    # Tools that only read state, so a turn made up of them can run concurrently
+    READ_ONLY_TOOLS = frozenset({"get_device_state_tool", "read_current_firmware"})
+    
+    def __init__(self, max_iterations: int = 10, model: Optional[str] = None):
+        # Deferred so importing the package doesn't pull in the OpenAI SDK
+        from langchain_openai import ChatOpenAI
+        
+        self.model = model or Config.LLM_MODEL
         self.llm = ChatOpenAI(
-            model=Config.LLM_MODEL,
-            temperature=Config.LLM_TEMPERATURE
+            model=self.model,
+            temperature=Config.LLM_TEMPERATURE,
+            max_tokens=Config.LLM_MAX_TOKENS,
+            http_client=_HTTP_CLIENT,
+            http_async_client=_HTTP_ASYNC_CLIENT
         )
         self.tools = get_all_tools()
-        self.tool_dict = {tool.name: tool for tool in self.tools}
-        self.llm_with_tools = self.llm.bind_tools(self.tools)
+        # The plain functions behind the @tool wrappers: the loop calls these
+        # directly, skipping BaseTool.invoke's callback and run-tracking overhead
+        self._tool_funcs = {tool.name: tool.func for tool in self.tools}
+        self._tool_schemas = {tool.name: tool.args_schema for tool in self.tools}
+        # Lets the model ask for independent tool calls (the two reads) in one
+        # turn; _execute_tool_calls then runs them concurrently.
+        self.llm_with_tools = self.llm.bind_tools(self.tools, parallel_tool_calls=True)
         self.max_iterations = max_iterations
         
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEM_PROMPT),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
-        ])
+        # The system prompt never changes, so build its message once
+        self._system_msg = SystemMessage(content=self.SYSTEM_PROMPT)
+        
+        # Long-lived pool for fanning out independent tool calls within a turn
+        self._tool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agent-tool")
     
     def invoke(self, input_dict: dict) -> dict:
         """Execute the agent with the given input."""
         input_text = input_dict["input"]
-        messages = [HumanMessage(content=input_text)]
+        # System and human messages followed by the scratchpad; the scratchpad
+        # is appended in place so no iteration copies the history.
+        messages: List[BaseMessage] = [self._system_msg, HumanMessage(content=input_text)]
         
         for i in range(self.max_iterations):
-            print(f"\n--- Agent Iteration {i+1} ---")
-            
-            # Format messages for prompt
-            prompt_value = self.prompt.invoke({
-                "input": input_text,
-                "agent_scratchpad": messages[1:] if len(messages) > 1 else []
-            })
+            log.info("--- Agent Iteration %d ---", i + 1)
             
             # Get LLM response
-            response = self.llm_with_tools.invoke(prompt_value.to_messages())
+            if _LLM_LIMITER:
+                _LLM_LIMITER.acquire()
+            response = self.llm_with_tools.invoke(messages)
             messages.append(response)
             
             # Check if we're done
             if not response.tool_calls:
-                print("\n--- Agent Complete ---")
+                log.info("--- Agent Complete ---")
                 return {"output": response.content}
             
             # Execute tools
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                tool_args = tool_call["args"]
-                
-                print(f"Calling tool: {tool_name} with args: {tool_args}")
-                
-                if tool_name in self.tool_dict:
-                    tool_result = self.tool_dict[tool_name].invoke(tool_args)
-                    messages.append(ToolMessage(
-                        content=str(tool_result),
-                        tool_call_id=tool_call["id"]
-                    ))
-                else:
-                    messages.append(ToolMessage(
-                        content=f"Error: Tool {tool_name} not found",
-                        tool_call_id=tool_call["id"]
-                    ))
+            messages.extend(self._execute_tool_calls(response.tool_calls))
+        
+        return {"output": "Max iterations reached"}
+    
+    async def ainvoke(self, input_dict: dict) -> dict:
+        """Async `invoke`: awaits the LLM on the event loop and runs tools in a thread."""
+        input_text = input_dict["input"]
+        messages: List[BaseMessage] = [self._system_msg, HumanMessage(content=input_text)]
+        
+        for i in range(self.max_iterations):
+            log.info("--- Agent Iteration %d ---", i + 1)
+            
+            if _LLM_LIMITER:
+                await _LLM_LIMITER.aacquire()
+            response = await self.llm_with_tools.ainvoke(messages)
+            messages.append(response)
+            
+            if not response.tool_calls:
+                log.info("--- Agent Complete ---")
+                return {"output": response.content}
+            
+            # Tools do blocking file and DB work
+            messages.extend(await asyncio.to_thread(self._execute_tool_calls, response.tool_calls))
         
         return {"output": "Max iterations reached"}
     
+    def stream(self, input_dict: dict) -> Iterator[str]:
+        """Execute the agent, yielding the LLM's text output as it is generated."""
+        input_text = input_dict["input"]
+        messages: List[BaseMessage] = [self._system_msg, HumanMessage(content=input_text)]
+        
+        for i in range(self.max_iterations):
+            log.info("--- Agent Iteration %d (streaming) ---", i + 1)
+            
+            # Forward tokens as they arrive while folding the chunks back into
+            # one message so tool calls can be read off the full response.
+            if _LLM_LIMITER:
+                _LLM_LIMITER.acquire()
+            response = None
+            for chunk in self.llm_with_tools.stream(messages):
+                if chunk.content:
+                    yield chunk.content
+                response = chunk if response is None else response + chunk
+            if response is None:
+                return
+            response = message_chunk_to_message(response)
+            messages.append(response)
+            
+            if not response.tool_calls:
+                log.info("--- Agent Complete ---")
+                return
+            
+            messages.extend(self._execute_tool_calls(response.tool_calls))
+        
+        yield "Max iterations reached"
+    
+    def _execute_tool_call(self, tool_call: dict) -> ToolMessage:
+        """Run a single tool call and wrap its result for the scratchpad."""
+        tool_name = tool_call["name"]
+        tool_args = tool_call["args"]
+        
+        log.info("Calling tool: %s", tool_name)
+        # Args include the full firmware on writes, so only at debug level
+        log.debug("Tool %s args: %r", tool_name, tool_args)
+        
+        if tool_name not in self._tool_funcs:
+            content = f"Error: Tool {tool_name} not found"
+        else:
+            try:
+                # Validate against the tool's schema as BaseTool.invoke would,
+                # dropping extra keys; pydantic's ValidationError is a ValueError
+                tool_args = self._tool_schemas[tool_name](**tool_args).dict()
+            except ValueError as e:
+                # Let the model see the mistake and retry instead of failing the run
+                content = f"Error: Invalid arguments for {tool_name}: {e}"
+            else:
+                # Read tools are cached in the tool layer, keyed by DB generation
+                # and firmware mtime, so nothing is memoized here
+                content = str(self._tool_funcs[tool_name](**tool_args))
+        return ToolMessage(content=content, tool_call_id=tool_call["id"])
+    
+    def _execute_tool_calls(self, tool_calls: List[dict]) -> List[ToolMessage]:
+        """Run one turn's tool calls, in parallel when they are all read-only."""
+        # Writes and flashes must keep the order the LLM asked for, so only a
+        # turn made up entirely of reads is fanned out to threads.
+        if len(tool_calls) > 1 and all(c["name"] in self.READ_ONLY_TOOLS for c in tool_calls):
+            return list(self._tool_executor.map(self._execute_tool_call, tool_calls))
+        return [self._execute_tool_call(c) for c in tool_calls]
+    
     @staticmethod
-    def create_agent_prompt(device_id: str, event_details: str, policy: str = None) -> str:
-        """Creates a formatted prompt for the agent."""
+    def create_agent_prompt(
+        device_id: str,
+        event_details: str,
+        policy: Optional[str] = None,
+        include_context: bool = True
+    ) -> str:
+        """Creates a formatted prompt for the agent.
+
+        With `include_context`, the device's state and current firmware are
+        embedded in the prompt so the agent can start from the rewrite.
+        """
         if policy:
             # Policy-driven mode (backward compatibility)
-            return f"""
-You have received a runtime event from device '{device_id}'.
-Event: '{event_details}'
-Policy: '{policy}'
-
-Follow these steps:
-1. Use 'get_device_state_tool' to understand the device configuration.
-2. Use 'read_current_firmware' to inspect the existing code.
-3. Rewrite the *entire firmware* in C++/Arduino format to implement the policy.
-4. Use 'write_new_firmware' to save the code.
-5. Use 'trigger_ota_flash' to simulate deployment.
-"""
+            prompt = _POLICY_TEMPLATE.format(
+                device_id=device_id, event_details=event_details, policy=policy
+            )
         else:
             # Autonomous decision-making mode
-            return f"""
-You have received a runtime event from device '{device_id}'.
-Event: '{event_details}'
-
-As an autonomous IoT firmware engineer, analyze this event and determine the optimal response.
-
-Consider these factors in your decision-making:
-1. **Device Safety**: Prevent damage, overheating, or malfunction
-2. **Power Efficiency**: Optimize battery life and energy consumption
-3. **Sensor Optimization**: Improve data quality and reliability
-4. **Network Management**: Handle connectivity issues intelligently
-5. **Security**: Protect against tampering and unauthorized access
-6. **Performance**: Balance responsiveness with resource constraints
-
-Follow these steps:
-1. Use 'get_device_state_tool' to understand the device configuration and available sensors
-2. Use 'read_current_firmware' to inspect the existing code and understand current behavior
-3. Analyze the event and determine the best firmware modifications based on:
-   - IoT industry best practices
-   - Arduino/embedded systems optimization techniques
-   - Sensor management strategies
-   - Power management principles
-   - Safety and reliability requirements
-4. Rewrite the *entire firmware* with your intelligent modifications
-5. Use 'write_new_firmware' to save the optimized code with detailed comments explaining your decisions
-6. Use 'trigger_ota_flash' to deploy the update
-
-Make autonomous decisions that demonstrate your expertise in IoT firmware engineering.
-Include detailed comments in your code explaining why you made each decision.
-"""
\ No newline at end of file
+            prompt = _AUTONOMOUS_TEMPLATE.format(
+                device_id=device_id, event_details=event_details
+            )
+        
+        context = get_device_context(device_id) if include_context else None
+        if context:
+            device_state, current_code = context
+            prompt += _CONTEXT_TEMPLATE.format(device_state=device_state, current_code=current_code)
+        return prompt
\ No newline at end of file
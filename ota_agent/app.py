@@ -1,13 +1,61 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import traceback
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 from .agent import FirmwareAgent
+from .config import Config, configure_logging
+
+
+class _RepeatedTracebackFilter(logging.Filter):
+    """Collapse repeats of the same exception to one line within `window` seconds."""
+    
+    def __init__(self, window: float = 60.0, max_keys: int = 256):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self._last_seen = {}
+        self._lock = threading.Lock()
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not record.exc_info:
+            return True
+        exc_type, exc, _ = record.exc_info
+        key = (exc_type, str(exc))
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_seen.get(key)
+            if last is None or now - last >= self.window:
+                if len(self._last_seen) >= self.max_keys:
+                    self._last_seen.clear()
+                self._last_seen[key] = now
+                return True
+        # Seen recently: keep the message, drop the traceback
+        record.exc_info = None
+        record.exc_text = None
+        return True
+
+
+log = logging.getLogger(__name__)
+log.addFilter(_RepeatedTracebackFilter())
 
 
 class EventRequest(BaseModel):
-    device_id: str
-    event_details: str
-    policy: str = None  # Optional - for backward compatibility
+    device_id: str = Field(min_length=1)
+    event_details: str = Field(min_length=1)
+    policy: Optional[str] = None  # Optional - for backward compatibility
+    model: Optional[str] = None  # Defaults to Config.LLM_MODEL
+    
+    @field_validator("model")
+    @classmethod
+    def _check_model(cls, model: Optional[str]) -> Optional[str]:
+        if model is not None and model not in Config.LLM_ALLOWED_MODELS:
+            raise ValueError(f"model must be one of: {', '.join(sorted(Config.LLM_ALLOWED_MODELS))}")
+        return model
 
 
 class HealthResponse(BaseModel):
@@ -19,39 +67,173 @@ class EventResponse(BaseModel):
     agent_output: str
 
 
-def create_app(agent: FirmwareAgent) -> FastAPI:
-    """Factory function to create and configure FastAPI app."""
-    app = FastAPI(title="OTA Agent", description="Autonomous IoT Firmware Management System")
+class BatchEventRequest(BaseModel):
+    events: List[EventRequest] = Field(min_length=1, max_length=32)
+    max_concurrency: int = Field(default=8, ge=1, le=32)
+
+
+class BatchEventResult(BaseModel):
+    success: bool
+    agent_output: str = ""
+    error: Optional[str] = None
+    elapsed_time: float
+
+
+class BatchEventResponse(BaseModel):
+    results: List[BatchEventResult]
+
+
+def _sse_event(data: str, event: Optional[str] = None) -> str:
+    """Frame one server-sent event; multi-line data needs a `data:` field per line."""
+    header = f"event: {event}\n" if event else ""
+    return header + "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+
+
+def _sse_stream(chunks: Iterable[str]) -> Iterator[str]:
+    """Frame text chunks as server-sent events, ending with a `done` event."""
+    try:
+        for chunk in chunks:
+            yield _sse_event(chunk)
+    except Exception as e:
+        log.exception("handle_event_stream failed: %s", e)
+        yield _sse_event(str(e), event="error")
+        return
+    yield _sse_event("", event="done")
+
+
+def create_app(agent: Optional[FirmwareAgent] = None) -> FastAPI:
+    """Factory function to create and configure FastAPI app.
+
+    Agents are built per model by the first request that needs them, so
+    worker startup doesn't pay for constructing the LLM client and tools.
+    A given `agent` is used for its own model.
+    """
+    # Encode JSON responses with orjson rather than the stdlib encoder
+    app = FastAPI(
+        title="OTA Agent",
+        description="Autonomous IoT Firmware Management System",
+        default_response_class=ORJSONResponse
+    )
+    
+    # One agent run per device at a time in this worker: each run rewrites the
+    # firmware snapshot embedded in its prompt, so overlapping runs would
+    # overwrite each other's changes and flash each other's builds. Entries
+    # vanish once no request holds or waits on the lock.
+    device_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+    
+    agents: Dict[str, FirmwareAgent] = {agent.model: agent} if agent is not None else {}
+    agent_lock = asyncio.Lock()
+    
+    async def get_agent(model: Optional[str] = None) -> FirmwareAgent:
+        """The worker's agent for `model`, created on first use."""
+        model = model or Config.LLM_MODEL
+        found = agents.get(model)
+        if found is None:
+            # One build per model even when several requests arrive together
+            async with agent_lock:
+                found = agents.get(model)
+                if found is None:
+                    # Importing langchain_openai and building the client takes a
+                    # while; doing it in a thread keeps /health and other requests moving
+                    found = agents[model] = await asyncio.to_thread(FirmwareAgent, model=model)
+        return found
     
     @app.get("/health", response_model=HealthResponse)
     async def health_check():
         """Health check endpoint."""
         return HealthResponse(status="healthy")
     
-    @app.post("/trigger-agent", response_model=EventResponse)
-    async def handle_event(request: EventRequest):
-        """Handle incoming device events and trigger agent."""
-        print(f"\n\n--- New Event for {request.device_id} ---")
-        print(f"Event: {request.event_details}")
+    async def run_event(request: EventRequest) -> EventResponse:
+        """Run the agent for one event."""
+        log.info("--- New Event for %s ---", request.device_id)
+        log.info("Event: %s", request.event_details)
         if request.policy:
-            print(f"Policy: {request.policy}")
+            log.info("Policy: %s", request.policy)
         else:
-            print("Mode: Autonomous Decision Making")
-        print("--- Invoking Agent ---")
+            log.info("Mode: Autonomous Decision Making")
+        
+        device_lock = device_locks.get(request.device_id)
+        if device_lock is None:
+            device_lock = device_locks[request.device_id] = asyncio.Lock()
+        async with device_lock:
+            log.info("--- Invoking Agent ---")
 
-        input_string = FirmwareAgent.create_agent_prompt(
-            request.device_id, request.event_details, request.policy
-        )
+            # The prompt embeds the device state and firmware, read from disk;
+            # built under the lock so it sees the previous run's write
+            input_string = await asyncio.to_thread(
+                FirmwareAgent.create_agent_prompt, request.device_id, request.event_details, request.policy
+            )
 
+            # LLM calls are awaited and tools run in a thread, so one worker
+            # keeps serving other requests (and devices) while this run is in flight.
+            agent = await get_agent(request.model)
+            result = await agent.ainvoke({"input": input_string})
+        return EventResponse(
+            success=True,
+            agent_output=result.get('output', '')
+        )
+    
+    @app.post("/trigger-agent", response_model=EventResponse)
+    async def handle_event(request: EventRequest):
+        """Handle incoming device events and trigger agent."""
         try:
-            result = agent.invoke({"input": input_string})
-            return EventResponse(
-                success=True,
-                agent_output=result.get('output', '')
-            )
+            return await run_event(request)
         except Exception as e:
-            print(f"Error: {e}")
-            traceback.print_exc()
+            log.exception("handle_event failed: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
     
-    return app
\ No newline at end of file
+    @app.post("/trigger-agent-batch", response_model=BatchEventResponse)
+    async def handle_event_batch(batch: BatchEventRequest):
+        """Handle several device events, running up to `max_concurrency` agents at once."""
+        log.info("--- New Batch of %d Events ---", len(batch.events))
+        semaphore = asyncio.Semaphore(batch.max_concurrency)
+        
+        async def run_one(request: EventRequest) -> BatchEventResult:
+            async with semaphore:
+                start_time = time.perf_counter()
+                try:
+                    response = await run_event(request)
+                    return BatchEventResult(
+                        success=True,
+                        agent_output=response.agent_output,
+                        elapsed_time=time.perf_counter() - start_time
+                    )
+                except Exception as e:
+                    # One failed event shouldn't fail the rest of the batch
+                    log.exception("handle_event_batch failed for %s: %s", request.device_id, e)
+                    return BatchEventResult(
+                        success=False,
+                        error=str(e),
+                        elapsed_time=time.perf_counter() - start_time
+                    )
+        
+        results = await asyncio.gather(*(run_one(request) for request in batch.events))
+        return BatchEventResponse(results=results)
+    
+    @app.post("/trigger-agent/stream")
+    async def handle_event_stream(request: EventRequest):
+        """Handle a device event, streaming the agent's output as it is generated."""
+        log.info("--- New Streaming Event for %s ---", request.device_id)
+        log.info("Event: %s", request.event_details)
+        
+        input_string = await asyncio.to_thread(
+            FirmwareAgent.create_agent_prompt, request.device_id, request.event_details, request.policy
+        )
+        agent = await get_agent(request.model)
+        # A sync iterator is driven from Starlette's threadpool, so the blocking
+        # LLM stream doesn't stall the event loop.
+        return StreamingResponse(
+            _sse_stream(agent.stream({"input": input_string})),
+            media_type="text/event-stream"
+        )
+    
+    return app
+
+
+def create_default_app() -> FastAPI:
+    """App factory for uvicorn workers: `uvicorn ota_agent.app:create_default_app --factory`."""
+    # Fail while the worker boots, not inside its first LLM request
+    Config.validate()
+    # Tool-level detail is logged at debug level, shown only with OTA_DEBUG=1
+    configure_logging(logging.DEBUG if Config.DEBUG else logging.INFO)
+    return create_app()
\ No newline at end of file
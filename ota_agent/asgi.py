@@ -0,0 +1,13 @@
+"""ASGI entry point for running under a process manager, e.g.
+
+    gunicorn ota_agent.asgi:app -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:5001 --preload
+
+`--preload` imports this module once in the master, so the firmware and DB
+bootstrap below runs before the workers fork rather than in each of them.
+"""
+from .app import create_default_app
+from .main import initialize_firmware_structure
+
+
+app = create_default_app()
+initialize_firmware_structure()
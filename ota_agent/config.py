@@ -1,20 +1,46 @@
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Run LangChain callback handlers (e.g. LangSmith tracing) in the background
+# instead of blocking each LLM call on them; set it to "false" to opt out.
+os.environ.setdefault("LANGCHAIN_CALLBACKS_BACKGROUND", "true")
+
 class Config:
     """Application configuration."""
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     DB_FILE = "db.json"
     FIRMWARE_DIR = "firmware"
     SERVER_PORT = 5001
-    DEBUG = True
-    LLM_MODEL = "gpt-4o-mini"
+    SERVER_WORKERS = int(os.getenv("OTA_SERVER_WORKERS", "4"))
+    DEBUG = os.getenv("OTA_DEBUG", "0") == "1"
+    LLM_MODEL = os.getenv("OTA_LLM_MODEL", "gpt-4o-mini")
+    # Models a request may pick via its `model` field (the default is always allowed)
+    LLM_ALLOWED_MODELS = frozenset(
+        m.strip() for m in os.getenv("OTA_LLM_ALLOWED_MODELS", "gpt-4o-mini,gpt-4o").split(",") if m.strip()
+    ) | {LLM_MODEL}
     LLM_TEMPERATURE = 0.2
+    LLM_MAX_TOKENS = int(os.getenv("OTA_LLM_MAX_TOKENS", "4096"))  # per response; a full firmware is ~1.5k
+    # OpenAI requests/minute for each server process; multiply by the worker count
+    # (OTA_SERVER_WORKERS, or gunicorn -w) for the total. 0 disables
+    LLM_MAX_RPM_PER_WORKER = int(os.getenv("OTA_LLM_MAX_RPM_PER_WORKER", "15"))
     
     @classmethod
     def validate(cls):
         """Validate required configuration."""
         if not cls.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY environment variable not set")
\ No newline at end of file
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+
+
+def configure_logging(level: int = logging.INFO):
+    """Attach a single stream handler to the package logger (idempotent)."""
+    logger = logging.getLogger("ota_agent")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+        ))
+        logger.addHandler(handler)
+    logger.setLevel(level)
\ No newline at end of file
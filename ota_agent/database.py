@@ -1,82 +1,316 @@
-import json
+import atexit
+import logging
+import mmap
 import os
-from typing import Optional, Dict, Any
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Tuple, Callable, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single worker only
+    fcntl = None
+
+import orjson
+from cachetools import LRUCache
+
+
+log = logging.getLogger(__name__)
+
+
+def _loads(data: bytes) -> Any:
+    return orjson.loads(data)
+
+
+def _dumps(obj: Any, pretty: bool = False) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else None)
+
+
+def _file_sig(st: os.stat_result) -> Tuple[int, int, int]:
+    # os.replace always gives the file a new inode, so this catches two
+    # replaces within one tick of a coarse-timestamp filesystem
+    return st.st_ino, st.st_mtime_ns, st.st_size
 
 
 class DeviceDatabase:
-    """Handles device state persistence."""
-    
-    def __init__(self, db_file: str):
+    """Handles device state persistence.
+
+    The whole DB is read once into memory; lookups are served from there and
+    the file is only re-read when its inode, mtime or size shows another
+    process replaced it.
+    Mutations are applied in memory and queued; a background timer writes them
+    back once `flush_delay` seconds later, so a burst of updates costs a single
+    write. Several workers share the file, so a flush takes an exclusive lock,
+    reloads whatever other processes wrote and re-applies the queued mutations
+    on top before replacing the file. Pending changes are also flushed at
+    interpreter exit.
+
+    Firmware file contents are cached too, keyed by path and validated against
+    the file's mtime, so repeat reads of the current firmware skip the disk.
+    A device's previous firmware is dropped when it moves to a new version,
+    and the cache holds at most `firmware_cache_size` files.
+    """
+
+    def __init__(
+        self,
+        db_file: str,
+        flush_delay: float = 0.5,
+        backup_count: int = 5,
+        firmware_cache_size: int = 64
+    ):
         self.db_file = db_file
-    
-    def get_device_state(self, device_id: str) -> Optional[Dict[str, Any]]:
-        """Reads the state of a device from the DB."""
+        self.flush_delay = flush_delay
+        self.backup_count = backup_count
+        self._lock = threading.RLock()
+        # (st_ino, st_mtime_ns, st_size) of the file last loaded or written
+        self._file_sig: Optional[Tuple[int, int, int]] = None
+        self._generation = 0
+        self._data = self._load()
+        # Mutations applied in memory but not yet written, re-applied after a reload
+        self._pending: List[Callable[[Dict[str, Any]], bool]] = []
+        self._flush_timer: Optional[threading.Timer] = None
+        self._firmware_cache: "LRUCache[str, Tuple[int, str]]" = LRUCache(maxsize=firmware_cache_size)
+        atexit.register(self.flush)
+
+    def _load(self) -> Dict[str, Any]:
+        """Reads the DB file, falling back to an empty DB if it is missing or unreadable."""
         try:
-            with open(self.db_file, 'r') as f:
-                data = json.load(f)
-            return data.get(device_id)
+            with open(self.db_file, 'rb') as f:
+                st = os.fstat(f.fileno())
+                self._file_sig = _file_sig(st)
+                if st.st_size == 0:
+                    return {}
+                # Parse straight out of the page cache, without a read() copy
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    return _loads(view)
         except FileNotFoundError:
-            print(f"Database file {self.db_file} not found")
-            return None
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from {self.db_file}: {e}")
-            return None
+            self._file_sig = None
+            return {}
+        except orjson.JSONDecodeError as e:
+            log.error("Error decoding JSON from %s: %s", self.db_file, e)
+            return {}
         except Exception as e:
-            print(f"Unexpected error reading device state: {e}")
-            return None
-    
-    def update_firmware_path(self, device_id: str, new_path: str) -> bool:
-        """Updates the firmware path for a device in the DB."""
+            log.error("Unexpected error loading database: %s", e)
+            return {}
+
+    def _refresh_if_changed(self):
+        """Reloads the DB if the file changed underneath us (e.g. another worker wrote it).
+
+        Unflushed local mutations are re-applied on top of the reloaded state.
+        """
         try:
-            with open(self.db_file, 'r') as f:
-                data = json.load(f)
-            
-            if device_id in data:
-                data[device_id]['current_firmware_path'] = new_path
-                if 'version_history' not in data[device_id]:
-                    data[device_id]['version_history'] = []
-                data[device_id]['version_history'].append(new_path)
-                
-                with open(self.db_file, 'w') as f:
-                    json.dump(data, f, indent=2)
+            file_sig = _file_sig(os.stat(self.db_file))
+        except FileNotFoundError:
+            return
+        if file_sig != self._file_sig:
+            self._data = self._load()
+            for mutation in self._pending:
+                mutation(self._data)
+            self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped whenever the in-memory state changes; usable as a cache key.
+
+        Reading it stats the file first, so changes written by another
+        process also produce a new generation.
+        """
+        with self._lock:
+            self._refresh_if_changed()
+            return self._generation
+
+    def _schedule_flush(self):
+        """Arms the delayed writer if it isn't already."""
+        with self._lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    @contextmanager
+    def _file_lock(self):
+        """Holds an exclusive lock on `<db_file>.lock` shared by all processes."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.db_file}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _rotate_backups(self):
+        """Shifts db.json.bak.N files up by one and copies the current file to .bak.1."""
+        if self.backup_count <= 0 or not os.path.exists(self.db_file):
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.db_file}.bak.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.db_file}.bak.{i + 1}")
+        shutil.copyfile(self.db_file, f"{self.db_file}.bak.1")
+
+    def flush(self) -> bool:
+        """Writes pending changes to the DB file via a temp file and `os.replace`.
+
+        On failure the changes stay queued and the delayed writer is re-armed.
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
                 return True
+
+            try:
+                with self._file_lock():
+                    # Pick up writes other workers made since our last load,
+                    # so ours are merged onto them instead of replacing them
+                    self._refresh_if_changed()
+                    fd, tmp_file = tempfile.mkstemp(
+                        dir=os.path.dirname(os.path.abspath(self.db_file)),
+                        prefix=f"{os.path.basename(self.db_file)}.",
+                        suffix=".tmp"
+                    )
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            f.write(_dumps(self._data))
+                            # Make the bytes durable before the rename publishes them,
+                            # so a crash leaves either the old or the new file intact
+                            f.flush()
+                            os.fsync(f.fileno())
+                        self._rotate_backups()
+                        os.replace(tmp_file, self.db_file)
+                    except BaseException:
+                        if os.path.exists(tmp_file):
+                            os.remove(tmp_file)
+                        raise
+                    self._file_sig = _file_sig(os.stat(self.db_file))
+                self._pending.clear()
+                return True
+            except Exception as e:
+                log.error("Unexpected error writing database: %s", e)
+                self._schedule_flush()
+                return False
+
+    def _mutate(self, mutation: Callable[[Dict[str, Any]], bool]) -> bool:
+        """Applies `mutation` to the in-memory DB and queues it for the next flush.
+
+        `mutation` must be safe to re-apply to a freshly reloaded DB and returns
+        False if it did not apply (nothing is queued then).
+        """
+        with self._lock:
+            self._refresh_if_changed()
+            if not mutation(self._data):
+                return False
+            self._pending.append(mutation)
+            self._generation += 1
+            self._schedule_flush()
+            return True
+
+    def export_pretty(self, path: Optional[str] = None) -> str:
+        """Returns the DB as indented JSON for humans, optionally writing it to `path`."""
+        with self._lock:
+            data = _dumps(self._data, pretty=True)
+        if path:
+            with open(path, 'wb') as f:
+                f.write(data)
+        return data.decode()
+
+    def get_device_state(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Reads the state of a device from the DB."""
+        with self._lock:
+            self._refresh_if_changed()
+            return self._data.get(device_id)
+
+    def _get_device_field(self, device_id: str, field: str) -> Optional[Any]:
+        with self._lock:
+            self._refresh_if_changed()
+            device = self._data.get(device_id)
+            return device.get(field) if device else None
+
+    def get_firmware_path(self, device_id: str) -> Optional[str]:
+        """Returns just the device's current firmware path, or None if unknown."""
+        return self._get_device_field(device_id, 'current_firmware_path')
+
+    def get_firmware_hash(self, device_id: str) -> Optional[str]:
+        """Returns the stored content hash of the device's current firmware, if recorded."""
+        return self._get_device_field(device_id, 'current_firmware_hash')
+
+    def read_firmware(self, path: str) -> str:
+        """Returns a firmware file's contents, re-reading only if its mtime changed."""
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._firmware_cache.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        with open(path, 'r') as f:
+            content = f.read()
+        with self._lock:
+            self._firmware_cache[path] = (mtime_ns, content)
+        return content
+
+    def update_firmware_path(
+        self,
+        device_id: str,
+        new_path: str,
+        content: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> bool:
+        """Updates the firmware path for a device in the DB.
+
+        Pass the `content` just written to `new_path` to seed the firmware cache
+        so the next read doesn't go back to disk, and its `content_hash` to
+        record it alongside the path.
+        """
+        def apply(data: Dict[str, Any]) -> bool:
+            device = data.get(device_id)
+            if device is None:
+                return False
+            device['current_firmware_path'] = new_path
+            if content_hash is not None:
+                device['current_firmware_hash'] = content_hash
             else:
-                print(f"Device {device_id} not found in database")
+                device.pop('current_firmware_hash', None)
+            device.setdefault('version_history', []).append(new_path)
+            return True
+
+        with self._lock:
+            previous_path = self.get_firmware_path(device_id)
+            if not self._mutate(apply):
+                log.warning("Device %s not found in database", device_id)
                 return False
-        except FileNotFoundError:
-            print(f"Database file {self.db_file} not found")
-            return False
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from {self.db_file}: {e}")
-            return False
-        except Exception as e:
-            print(f"Unexpected error updating firmware path: {e}")
-            return False
-    
+            if previous_path != new_path:
+                self._firmware_cache.pop(previous_path, None)
+            if content is not None:
+                try:
+                    self._firmware_cache[new_path] = (os.stat(new_path).st_mtime_ns, content)
+                except OSError:
+                    self._firmware_cache.pop(new_path, None)
+            return True
+
     def initialize_device(self, device_id: str, initial_firmware_path: str):
         """Initialize a device in the database if it doesn't exist."""
-        try:
-            if os.path.exists(self.db_file):
-                with open(self.db_file, 'r') as f:
-                    data = json.load(f)
-            else:
-                data = {}
-            
-            if device_id not in data:
-                data[device_id] = {
-                    "current_firmware_path": initial_firmware_path,
-                    "sensor_schema": {
-                        "A": {"type": "temperature", "pin": 1, "unit": "celsius"},
-                        "B": {"type": "humidity", "pin": 2, "unit": "percentage"},
-                        "C": {"type": "pressure", "pin": 3, "unit": "pascal"},
-                        "D": {"type": "light_intensity", "pin": 4, "unit": "lux"},
-                        "E": {"type": "motion", "pin": 5, "unit": "boolean"},
-                        "F": {"type": "gps_latitude", "pin": 6, "unit": "degrees"}
-                    },
-                    "version_history": [initial_firmware_path]
-                }
-                
-                with open(self.db_file, 'w') as f:
-                    json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error initializing device: {e}")
\ No newline at end of file
+        def apply(data: Dict[str, Any]) -> bool:
+            if device_id in data:
+                return False
+            data[device_id] = {
+                "current_firmware_path": initial_firmware_path,
+                "sensor_schema": {
+                    "A": {"type": "temperature", "pin": 1, "unit": "celsius"},
+                    "B": {"type": "humidity", "pin": 2, "unit": "percentage"},
+                    "C": {"type": "pressure", "pin": 3, "unit": "pascal"},
+                    "D": {"type": "light_intensity", "pin": 4, "unit": "lux"},
+                    "E": {"type": "motion", "pin": 5, "unit": "boolean"},
+                    "F": {"type": "gps_latitude", "pin": 6, "unit": "degrees"}
+                },
+                "version_history": [initial_firmware_path]
+            }
+            return True
+
+        with self._lock:
+            if self._mutate(apply):
+                # Written straight away: worker processes load the file on startup
+                self.flush()
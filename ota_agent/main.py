@@ -1,10 +1,14 @@
+import importlib.util
 import os
+import pkgutil
 import sys
 import uvicorn
 from .config import Config
 from .database import DeviceDatabase
-from .agent import FirmwareAgent
-from .app import create_app
+
+
+# Bootstrap firmware for new devices, read once from the package as bytes
+_INITIAL_FIRMWARE_BYTES = pkgutil.get_data(__package__, "_firmware_template.cpp")
 
 
 def initialize_firmware_structure():
@@ -14,53 +18,9 @@ def initialize_firmware_structure():
     initial_firmware_path = os.path.join(Config.FIRMWARE_DIR, device_id, "v1.0.cpp")
     
     if not os.path.exists(initial_firmware_path):
-        initial_code = """// Firmware Version: 1.0
-// Description: Initial firmware that monitors sensors A, C, D based on device schema
-#include <Arduino.h>
-
-// --- Pin Definitions (based on sensor_schema)
-#define SENSOR_A_PIN 1  // temperature
-#define SENSOR_C_PIN 3  // pressure  
-#define SENSOR_D_PIN 4  // light_intensity
-
-// --- Configuration ---
-const int SENSOR_A_THRESHOLD = 100;
-
-void setup() {
-    Serial.begin(115200);
-    while (!Serial);
-    Serial.println("============================");
-    Serial.println("Device starting... Firmware v1.0");
-    Serial.println("Mode: Monitoring Sensors A, C, D");
-    Serial.println("============================");
-    
-    pinMode(SENSOR_A_PIN, INPUT);
-    pinMode(SENSOR_C_PIN, INPUT);
-    pinMode(SENSOR_D_PIN, INPUT);
-}
-
-void loop() {
-    int sensor_a_value = analogRead(SENSOR_A_PIN);
-    int sensor_c_value = analogRead(SENSOR_C_PIN);
-    int sensor_d_value = analogRead(SENSOR_D_PIN);
-
-    Serial.print("DATA: Sensor A (temperature): ");
-    Serial.println(sensor_a_value);
-    Serial.print("DATA: Sensor C (pressure): ");
-    Serial.println(sensor_c_value);
-    Serial.print("DATA: Sensor D (light_intensity): ");
-    Serial.println(sensor_d_value);
-
-    if (sensor_a_value > SENSOR_A_THRESHOLD) {
-        Serial.println("EVENT: sensor_A_threshold_exceeded");
-    }
-
-    Serial.println("---");
-    delay(5000);
-}
-"""
-        with open(initial_firmware_path, 'w') as f:
-            f.write(initial_code)
+        # Already bytes, so this is a single write with no re-encode
+        with open(initial_firmware_path, 'wb') as f:
+            f.write(_INITIAL_FIRMWARE_BYTES)
     
     # Initialize device in database
     db = DeviceDatabase(Config.DB_FILE)
@@ -76,16 +36,18 @@ def main():
         # Initialize structures
         initialize_firmware_structure()
         
-        # Create agent and app
-        agent = FirmwareAgent()
-        app = create_app(agent)
-        
-        # Run server with uvicorn
-        print(f"Starting OTA Agent Server on port {Config.SERVER_PORT}...")
+        # Run server with uvicorn; each worker builds its own agent and app
+        print(f"Starting OTA Agent Server on port {Config.SERVER_PORT} "
+              f"with {Config.SERVER_WORKERS} worker(s)...")
         uvicorn.run(
-            app, 
+            "ota_agent.app:create_default_app",
+            factory=True,
             host="0.0.0.0", 
             port=Config.SERVER_PORT,
+            workers=Config.SERVER_WORKERS,
+            # libuv event loop and C HTTP parser; both ship with uvicorn[standard]
+            loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+            http="httptools" if importlib.util.find_spec("httptools") else "h11",
             log_level="info" if not Config.DEBUG else "debug"
         )
         
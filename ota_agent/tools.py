@@ -1,28 +1,84 @@
-import json
+import functools
+import hashlib
+import logging
 import os
-from datetime import datetime
+import time
+from typing import Any, Dict, Optional, Tuple
+import orjson
 from langchain_core.tools import tool
 from .database import DeviceDatabase
 from .config import Config
 
 
+log = logging.getLogger(__name__)
+
 # Initialize database instance
 db = DeviceDatabase(Config.DB_FILE)
 
+# Firmware directories already created by this process
+_ensured_dirs = set()
+
+
+@functools.lru_cache(maxsize=32)
+def _get_state(device_id: str, generation: int) -> Optional[Dict[str, Any]]:
+    """Device state as of one DB generation; any DB change moves to a new key."""
+    return db.get_device_state(device_id)
+
+
+def _device_state(device_id: str) -> Optional[Dict[str, Any]]:
+    """Shared state lookup for all tools, cached until the DB changes."""
+    return _get_state(device_id, db.generation)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_state_json(device_id: str, generation: int) -> Optional[str]:
+    """Indented JSON of a device's state as of one DB generation."""
+    state = _get_state(device_id, generation)
+    return orjson.dumps(state, option=orjson.OPT_INDENT_2).decode() if state else None
+
+
+def _firmware_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _current_firmware_hash(device_id: str) -> Optional[str]:
+    """Hash of the device's current firmware, from the DB or else from its (cached) file."""
+    stored = db.get_firmware_hash(device_id)
+    if stored:
+        return stored
+    firmware_path = db.get_firmware_path(device_id)
+    if not firmware_path:
+        return None
+    try:
+        return _firmware_hash(db.read_firmware(firmware_path).encode())
+    except FileNotFoundError:
+        return None
+
+
+def _write_file(path: str, data: bytes):
+    """Writes `data` straight to a raw fd, bypassing the text I/O layer."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
 
 @tool
 def read_current_firmware(device_id: str) -> str:
     """Reads the current firmware code for a given device ID."""
-    print(f"\nTOOL: Reading firmware for device '{device_id}'...")
-    state = db.get_device_state(device_id)
+    log.debug("Reading firmware for device '%s'", device_id)
+    state = _device_state(device_id)
     if not state or 'current_firmware_path' not in state:
         return f"Error: No firmware path found for device_id '{device_id}'."
     
     firmware_path = state['current_firmware_path']
     try:
-        with open(firmware_path, 'r') as f:
-            content = f.read()
-        print(f"TOOL: Successfully read {firmware_path}")
+        content = db.read_firmware(firmware_path)
+        log.debug("Successfully read %s", firmware_path)
         return content
     except FileNotFoundError:
         return f"Error: Firmware file not found at path: {firmware_path}"
@@ -31,18 +87,26 @@ def read_current_firmware(device_id: str) -> str:
 @tool
 def write_new_firmware(device_id: str, new_code: str) -> str:
     """Writes new firmware code to a file for a specific device."""
-    print(f"\nTOOL: Writing new firmware for device '{device_id}'...")
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    new_version_str = f"v{timestamp}"
+    log.debug("Writing new firmware for device '%s'", device_id)
+    new_bytes = new_code.encode()
+    new_hash = _firmware_hash(new_bytes)
+    if new_hash == _current_firmware_hash(device_id):
+        # Identical code: don't add a version that changes nothing
+        log.debug("Firmware unchanged (%s), skipping write", new_hash)
+        return f"No change: firmware for device {device_id} is already at {new_hash}."
+    
+    # Nanosecond epoch timestamp: cheap to produce and unique under burst writes
+    new_version_str = f"v{time.time_ns()}"
     device_firmware_dir = os.path.join(Config.FIRMWARE_DIR, device_id)
-    os.makedirs(device_firmware_dir, exist_ok=True)
+    if device_firmware_dir not in _ensured_dirs:
+        os.makedirs(device_firmware_dir, exist_ok=True)
+        _ensured_dirs.add(device_firmware_dir)
     new_firmware_path = os.path.join(device_firmware_dir, f"{new_version_str}.cpp")
 
     try:
-        with open(new_firmware_path, 'w') as f:
-            f.write(new_code)
-        db.update_firmware_path(device_id, new_firmware_path)
-        print(f"TOOL: New firmware saved to {new_firmware_path} and DB updated.")
+        _write_file(new_firmware_path, new_bytes)
+        db.update_firmware_path(device_id, new_firmware_path, new_code, new_hash)
+        log.debug("New firmware saved to %s and DB updated", new_firmware_path)
         return f"Successfully wrote new firmware version {new_version_str} for device {device_id}."
     except Exception as e:
         return f"Error writing firmware: {e}"
@@ -51,24 +115,35 @@ def write_new_firmware(device_id: str, new_code: str) -> str:
 @tool
 def get_device_state_tool(device_id: str) -> str:
     """Retrieves the sensor schema and current configuration for a device."""
-    print(f"\nTOOL: Getting state for device '{device_id}'...")
-    state = db.get_device_state(device_id)
-    if state:
-        return json.dumps(state, indent=2)
+    log.debug("Getting state for device '%s'", device_id)
+    state_json = _get_state_json(device_id, db.generation)
+    if state_json:
+        return state_json
     return f"Error: No state found for device_id '{device_id}'."
 
 
 @tool
 def trigger_ota_flash(device_id: str) -> str:
     """Simulates triggering an OTA flash process for the device."""
-    print(f"\nTOOL: Triggering OTA flash for device '{device_id}'...")
-    state = db.get_device_state(device_id)
-    latest_firmware = state.get('current_firmware_path', 'N/A') if state else 'N/A'
+    log.debug("Triggering OTA flash for device '%s'", device_id)
+    latest_firmware = db.get_firmware_path(device_id) or 'N/A'
     log_message = f"OTA flash triggered for device '{device_id}'. Device will now update to: '{latest_firmware}'."
-    print(f"TOOL: {log_message}")
+    log.info("%s", log_message)
     return log_message
 
 
+def get_device_context(device_id: str) -> Optional[Tuple[str, str]]:
+    """The device's state JSON and current firmware, as the two read tools return them."""
+    state_json = _get_state_json(device_id, db.generation)
+    firmware_path = db.get_firmware_path(device_id)
+    if not state_json or not firmware_path:
+        return None
+    try:
+        return state_json, db.read_firmware(firmware_path)
+    except FileNotFoundError:
+        return None
+
+
 def get_all_tools():
     """Returns all available tools for the agent."""
     return [
@@ -4,27 +4,48 @@ Training data executor for OTA Agent.
 Runs all scenarios from training_data.json to test and train the autonomous agent.
 """
 
+import asyncio
+import httpx
 import requests
-import json
+import orjson
 import time
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "http://localhost:5001"
 TRAINING_DATA_FILE = "training_data.json"
 RESULTS_DIR = "training_results"
 
+# One pooled session so every scenario reuses a keep-alive connection.
+# Retries cover connection failures only; urllib3 won't resend a POST that reached the server.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+))
+
+# Set once the server has answered; later runs in this process skip the health probe
+_server_healthy = False
+
 def load_training_data():
     """Load training scenarios from JSON file."""
-    with open(TRAINING_DATA_FILE, 'r') as f:
-        return json.load(f)
+    with open(TRAINING_DATA_FILE, 'rb') as f:
+        return orjson.loads(f.read())
 
-def run_scenario(scenario, delay=2):
-    """Execute a single training scenario."""
-    payload = {
+def scenario_payload(scenario):
+    """Request body for a training scenario."""
+    return {
         "device_id": scenario["device_id"],
         "event_details": scenario["event_details"]
     }
+
+def run_scenario(scenario):
+    """Execute a single training scenario."""
+    payload = scenario_payload(scenario)
     
     print(f"\n{'='*80}")
     print(f"Scenario {scenario['id']}: {scenario['category']}")
@@ -37,7 +58,7 @@ def run_scenario(scenario, delay=2):
     
     try:
         start_time = time.time()
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/trigger-agent",
             json=payload,
             headers={"Content-Type": "application/json"},
@@ -46,7 +67,8 @@ def run_scenario(scenario, delay=2):
         elapsed_time = time.time() - start_time
         
         if response.status_code == 200:
-            result = response.json()
+            mark_server_healthy()
+            result = orjson.loads(response.content)
             print(f"\n✅ Success (took {elapsed_time:.2f}s)")
             print(f"Agent Response: {result.get('agent_output', 'No output')[:300]}...")
             
@@ -82,8 +104,6 @@ def run_scenario(scenario, delay=2):
             "error": str(e),
             "timestamp": datetime.now().isoformat()
         }
-    finally:
-        time.sleep(delay)
 
 def save_results(results, metadata):
     """Save training results to file."""
@@ -92,22 +112,29 @@ def save_results(results, metadata):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     results_file = f"{RESULTS_DIR}/training_results_{timestamp}.json"
     
+    # Tally statuses and time in one pass over the results
+    status_counts = Counter()
+    total_time = 0
+    for r in results:
+        status_counts[r["status"]] += 1
+        total_time += r.get("elapsed_time", 0)
+    
     output = {
         "metadata": metadata,
         "execution_time": datetime.now().isoformat(),
         "results": results,
         "summary": {
             "total_scenarios": len(results),
-            "successful": sum(1 for r in results if r["status"] == "success"),
-            "failed": sum(1 for r in results if r["status"] == "failed"),
-            "timeout": sum(1 for r in results if r["status"] == "timeout"),
-            "errors": sum(1 for r in results if r["status"] == "error"),
-            "average_time": sum(r.get("elapsed_time", 0) for r in results) / len(results) if results else 0
+            "successful": status_counts["success"],
+            "failed": status_counts["failed"],
+            "timeout": status_counts["timeout"],
+            "errors": status_counts["error"],
+            "average_time": total_time / len(results) if results else 0
         }
     }
     
-    with open(results_file, 'w') as f:
-        json.dump(output, f, indent=2)
+    with open(results_file, 'wb') as f:
+        f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
     
     print(f"\n📊 Results saved to: {results_file}")
     return output
@@ -125,50 +152,82 @@ def print_summary(summary):
     print(f"⏰ Average Time: {summary['average_time']:.2f}s")
     print(f"{'='*80}")
 
-def run_all_scenarios(start_from=1, limit=None, categories=None, delay=2):
-    """Run all training scenarios with optional filtering."""
-    print("🤖 OTA Agent Training Data Executor")
-    print("="*80)
+def filter_scenarios(scenarios, start_from=1, limit=None, categories=None):
+    """Apply the category, start and limit filters to the scenario list."""
+    if categories:
+        scenarios = [s for s in scenarios if s["category"] in categories]
+        print(f"Filtering by categories: {', '.join(categories)}")
+    
+    if start_from > 1:
+        scenarios = [s for s in scenarios if s["id"] >= start_from]
+        print(f"Starting from scenario {start_from}")
     
-    # Check server health
+    if limit:
+        scenarios = scenarios[:limit]
+        print(f"Limiting to {limit} scenarios")
+    
+    return scenarios
+
+def mark_server_healthy():
+    """Record that the server has answered, so later runs skip the health probe."""
+    global _server_healthy
+    _server_healthy = True
+
+def check_server():
+    """Probe /health unless the server has already answered in this process."""
+    if _server_healthy:
+        return True
     try:
-        health_response = requests.get(f"{BASE_URL}/health", timeout=5)
+        health_response = SESSION.get(f"{BASE_URL}/health", timeout=5)
         if health_response.status_code != 200:
             print("❌ Server health check failed!")
-            return
-    except:
+            return False
+    except requests.exceptions.RequestException:
         print("❌ Cannot connect to server. Make sure it's running: python run.py")
-        return
+        return False
     
+    mark_server_healthy()
     print("✅ Server is running\n")
+    return True
+
+def run_all_scenarios(start_from=1, limit=None, categories=None, delay=2, concurrency=8):
+    """Run all training scenarios with optional filtering.
+
+    With `concurrency` > 1 up to that many /trigger-agent requests are kept
+    in flight, so they spread across the server's workers and each scenario
+    is reported on its own; with 1 they run one at a time, starting at least
+    `delay` seconds apart.
+    """
+    print("🤖 OTA Agent Training Data Executor")
+    print("="*80)
+    
+    if not check_server():
+        return
     
     # Load training data
     training_data = load_training_data()
     scenarios = training_data["training_scenarios"]
     metadata = training_data["metadata"]
     
-    # Filter scenarios
-    if categories:
-        scenarios = [s for s in scenarios if s["category"] in categories]
-        print(f"Filtering by categories: {', '.join(categories)}")
-    
-    if start_from > 1:
-        scenarios = [s for s in scenarios if s["id"] >= start_from]
-        print(f"Starting from scenario {start_from}")
-    
-    if limit:
-        scenarios = scenarios[:limit]
-        print(f"Limiting to {limit} scenarios")
-    
+    scenarios = filter_scenarios(scenarios, start_from, limit, categories)
     print(f"\nExecuting {len(scenarios)} scenarios...")
-    print(f"Delay between scenarios: {delay}s\n")
     
     # Execute scenarios
-    results = []
-    for i, scenario in enumerate(scenarios, 1):
-        print(f"\n[{i}/{len(scenarios)}]")
-        result = run_scenario(scenario, delay=delay)
-        results.append(result)
+    if concurrency > 1:
+        print(f"Running up to {concurrency} scenarios concurrently\n")
+        results = asyncio.run(run_scenarios_async(scenarios, concurrency))
+    else:
+        print(f"Minimum spacing between scenarios: {delay}s\n")
+        results = []
+        last_call_time = None
+        for i, scenario in enumerate(scenarios, 1):
+            # Only wait out whatever part of `delay` the previous scenario didn't already take
+            if last_call_time is not None:
+                time.sleep(max(0, delay - (time.monotonic() - last_call_time)))
+            last_call_time = time.monotonic()
+            print(f"\n[{i}/{len(scenarios)}]")
+            result = run_scenario(scenario)
+            results.append(result)
     
     # Save and display results
     output = save_results(results, metadata)
@@ -176,44 +235,185 @@ def run_all_scenarios(start_from=1, limit=None, categories=None, delay=2):
     
     return output
 
-def run_by_category(category, delay=2):
+class RateLimiter:
+    """Spaces request starts out to at most `rate` per `period` seconds."""
+    
+    def __init__(self, rate, period=60.0):
+        self.interval = period / rate
+        self._next_slot = 0.0
+    
+    async def acquire(self):
+        # No await between reading and claiming the slot, so no lock is needed
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+async def run_scenario_async(client, scenario, semaphore, limiter=None):
+    """Execute a single training scenario alongside the other in-flight ones."""
+    # Output is collected and printed in one go so concurrent scenarios don't interleave
+    lines = [
+        f"\n{'='*80}",
+        f"Scenario {scenario['id']}: {scenario['category']}",
+        f"{'='*80}",
+        f"Event: {scenario['event_details']}",
+        f"Severity: {scenario['severity']}",
+    ]
+    
+    async with semaphore:
+        if limiter:
+            await limiter.acquire()
+        try:
+            start_time = time.time()
+            response = await client.post("/trigger-agent", json=scenario_payload(scenario))
+            elapsed_time = time.time() - start_time
+            
+            if response.status_code == 200:
+                mark_server_healthy()
+                result = orjson.loads(response.content)
+                lines.append(f"✅ Success (took {elapsed_time:.2f}s)")
+                lines.append(f"Agent Response: {result.get('agent_output', 'No output')[:300]}...")
+                return {
+                    "scenario_id": scenario["id"],
+                    "status": "success",
+                    "elapsed_time": elapsed_time,
+                    "agent_output": result.get('agent_output', ''),
+                    "timestamp": datetime.now().isoformat()
+                }
+            
+            lines.append(f"❌ Failed with status {response.status_code}")
+            lines.append(f"Error: {response.text}")
+            return {
+                "scenario_id": scenario["id"],
+                "status": "failed",
+                "error": response.text,
+                "timestamp": datetime.now().isoformat()
+            }
+        except httpx.TimeoutException:
+            lines.append("⏱️ Timed out connecting to the server")
+            return {
+                "scenario_id": scenario["id"],
+                "status": "timeout",
+                "timestamp": datetime.now().isoformat()
+            }
+        except Exception as e:
+            lines.append(f"❌ Exception: {e}")
+            return {
+                "scenario_id": scenario["id"],
+                "status": "error",
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+        finally:
+            print("\n".join(lines))
+
+def _async_client():
+    # No read timeout: the server runs one scenario per device at a time, so a
+    # request can queue behind others for the same device for minutes
+    return httpx.AsyncClient(base_url=BASE_URL, timeout=httpx.Timeout(None, connect=5))
+
+async def run_scenarios_async(scenarios, concurrency, rate_per_minute=None):
+    """Execute `scenarios` with up to `concurrency` /trigger-agent requests in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate_per_minute) if rate_per_minute else None
+    async with _async_client() as client:
+        return list(await asyncio.gather(*(
+            run_scenario_async(client, scenario, semaphore, limiter) for scenario in scenarios
+        )))
+
+async def run_all_scenarios_async(start_from=1, limit=None, categories=None, concurrency=10, rate_per_minute=None):
+    """Run training scenarios concurrently from the client, `concurrency` requests at a time.
+
+    Works against a plain /trigger-agent server; `rate_per_minute` optionally
+    caps how fast new requests start, in place of a fixed per-request delay.
+    """
+    print("🤖 OTA Agent Training Data Executor (async)")
+    print("="*80)
+    
+    async with _async_client() as client:
+        if not _server_healthy:
+            try:
+                health_response = await client.get("/health", timeout=5)
+                if health_response.status_code != 200:
+                    print("❌ Server health check failed!")
+                    return
+            except Exception:
+                print("❌ Cannot connect to server. Make sure it's running: python run.py")
+                return
+            mark_server_healthy()
+            print("✅ Server is running\n")
+        
+        training_data = load_training_data()
+        scenarios = filter_scenarios(training_data["training_scenarios"], start_from, limit, categories)
+        metadata = training_data["metadata"]
+        
+        print(f"\nExecuting {len(scenarios)} scenarios, up to {concurrency} at a time...")
+    
+    results = await run_scenarios_async(scenarios, concurrency, rate_per_minute)
+    output = save_results(results, metadata)
+    print_summary(output["summary"])
+    
+    return output
+
+def run_by_category(category, delay=2, concurrency=8):
     """Run all scenarios in a specific category."""
     print(f"🎯 Running scenarios for category: {category}")
-    return run_all_scenarios(categories=[category], delay=delay)
+    return run_all_scenarios(categories=[category], delay=delay, concurrency=concurrency)
 
-def run_sample(count=10, delay=2):
+def run_sample(count=10, delay=2, concurrency=8):
     """Run a sample of scenarios for quick testing."""
     print(f"🎲 Running {count} sample scenarios")
-    return run_all_scenarios(limit=count, delay=delay)
+    return run_all_scenarios(limit=count, delay=delay, concurrency=concurrency)
 
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
+    def pop_option(argv, name, convert):
+        """Remove `name VALUE` from argv and return the converted value, or None."""
+        if name not in argv:
+            return None
+        i = argv.index(name)
+        value = convert(argv[i + 1])
+        del argv[i:i + 2]
+        return value
+    
+    # --concurrency N: requests in flight (1 runs the scenarios one at a
+    # time, 2s apart); --rate N: at most N scenario starts per minute (async)
+    argv = sys.argv[:]
+    concurrency_option = pop_option(argv, "--concurrency", int)
+    rate = pop_option(argv, "--rate", float)
+    concurrency = concurrency_option or 8
+    
+    if len(argv) > 1:
+        command = argv[1]
         
         if command == "sample":
-            count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-            run_sample(count=count)
+            count = int(argv[2]) if len(argv) > 2 else 10
+            run_sample(count=count, concurrency=concurrency)
         
         elif command == "category":
-            if len(sys.argv) < 3:
+            if len(argv) < 3:
                 print("Usage: python run_training_scenarios.py category <category_name>")
                 print("Available categories:")
                 data = load_training_data()
                 for cat in data["metadata"]["categories"]:
                     print(f"  - {cat}")
             else:
-                category = sys.argv[2]
-                run_by_category(category)
+                category = argv[2]
+                run_by_category(category, concurrency=concurrency)
         
         elif command == "range":
-            start = int(sys.argv[2]) if len(sys.argv) > 2 else 1
-            limit = int(sys.argv[3]) if len(sys.argv) > 3 else None
-            run_all_scenarios(start_from=start, limit=limit)
+            start = int(argv[2]) if len(argv) > 2 else 1
+            limit = int(argv[3]) if len(argv) > 3 else None
+            run_all_scenarios(start_from=start, limit=limit, concurrency=concurrency)
         
         elif command == "all":
-            run_all_scenarios()
+            run_all_scenarios(concurrency=concurrency)
+        
+        elif command == "async":
+            concurrency = int(argv[2]) if len(argv) > 2 else concurrency_option or 10
+            asyncio.run(run_all_scenarios_async(concurrency=concurrency, rate_per_minute=rate))
         
         else:
             print("Unknown command. Available commands:")
@@ -221,6 +421,10 @@ if __name__ == "__main__":
             print("  category <name>          - Run all scenarios in a category")
             print("  range <start> [limit]    - Run scenarios from start with optional limit")
             print("  all                      - Run all 100 scenarios")
+            print("  async [concurrency]      - Run all scenarios concurrently from the client (default: 10)")
+            print("Options:")
+            print("  --concurrency N          - Scenarios in flight at once (default: 8, async: 10; 1 = one at a time)")
+            print("  --rate N                 - With async, start at most N scenarios per minute")
     else:
         # Default: run sample
-        run_sample(count=10)
+        run_sample(count=10, concurrency=concurrency)
@@ -4,83 +4,227 @@ Simple test script to verify the FastAPI conversion works.
 Run this after starting the server to test the endpoints.
 """
 
-import requests
-import json
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import httpx
+import orjson
 
 BASE_URL = "http://localhost:5001"
 
-def test_health_endpoint():
-    """Test the health check endpoint."""
+# Request bodies never change, so they are encoded once up front
+POLICY_PAYLOAD = {
+    "device_id": "device-001",
+    "event_details": "sensor_A_threshold_exceeded",
+    "policy": "When sensor A exceeds threshold, activate sensor B monitoring"
+}
+POLICY_BODY = orjson.dumps(POLICY_PAYLOAD)
+
+AUTONOMOUS_PAYLOAD = {
+    "device_id": "device-001",
+    "event_details": "sensor_A_temperature_85_celsius_sustained_high_reading"
+}
+AUTONOMOUS_BODY = orjson.dumps(AUTONOMOUS_PAYLOAD)
+
+# Load requests only differ by index, filled into the encoded body with %
+LOAD_EVENT = "load_test_%d_sensor_A_threshold_exceeded"
+LOAD_BODY_TEMPLATE = orjson.dumps({"device_id": "device-001", "event_details": LOAD_EVENT})
+
+# (test name, status code or None, seconds, HTTP version, response body or error),
+# buffered and written as one report at the end instead of printed per request
+RESULTS = []
+VERBOSE = False
+
+def record(name, status, elapsed, http_version, detail):
+    """Buffer one test result; with --verbose it is also printed straight away."""
+    RESULTS.append((name, status, elapsed, http_version, detail))
+    if VERBOSE:
+        print(f"[{name}] {status} in {elapsed:.2f}s ({http_version}): {detail}")
+
+def print_report():
+    """Write every buffered result in a single write."""
+    lines = []
+    for name, status, elapsed, http_version, detail in RESULTS:
+        if status == 200:
+            lines.append(f"✅ {name}: {status} in {elapsed:.2f}s ({http_version})")
+        else:
+            lines.append(f"❌ {name}: {status or 'error'} in {elapsed:.2f}s - {detail}")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+async def timed_request(client, name, method, url, **kwargs):
+    """Send one request and record its outcome; returns the status code, or None on error."""
+    start = time.perf_counter()
+    http_version = None
     try:
-        response = requests.get(f"{BASE_URL}/health")
-        print(f"Health check status: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return response.status_code == 200
+        response = await client.request(method, url, **kwargs)
+        http_version = response.http_version
+        status, detail = response.status_code, orjson.loads(response.content)
     except Exception as e:
-        print(f"Health check failed: {e}")
+        status, detail = None, e
+    record(name, status, time.perf_counter() - start, http_version, detail)
+    return status
+
+# Base URLs whose health check has passed during this run
+_HEALTHY = set()
+CACHE_HEALTH = True
+
+async def check_health(client):
+    """Test the health check endpoint; a pass is remembered for the rest of the run."""
+    base_url = str(client.base_url)
+    if CACHE_HEALTH and base_url in _HEALTHY:
+        return True
+    if await timed_request(client, "health", "GET", "/health", timeout=5) != 200:
         return False
+    _HEALTHY.add(base_url)
+    return True
 
-def test_trigger_agent_endpoint():
+async def check_policy_mode(client):
     """Test the trigger-agent endpoint with policy."""
-    test_payload = {
-        "device_id": "device-001",
-        "event_details": "sensor_A_threshold_exceeded",
-        "policy": "When sensor A exceeds threshold, activate sensor B monitoring"
-    }
+    return await timed_request(client, "policy-driven", "POST", "/trigger-agent", content=POLICY_BODY) == 200
+
+async def check_autonomous_mode(client):
+    """Test the autonomous trigger-agent endpoint (no policy)."""
+    return await timed_request(client, "autonomous", "POST", "/trigger-agent", content=AUTONOMOUS_BODY) == 200
+
+async def warm_up(client, connections):
+    """Open `connections` pooled connections with throwaway /health GETs.
     
+    Run before anything is timed, so TCP (and TLS) handshakes don't show up
+    in the measured latencies and the pool isn't hit by a burst of them.
+    """
     try:
-        response = requests.post(
-            f"{BASE_URL}/trigger-agent",
-            json=test_payload,
-            headers={"Content-Type": "application/json"}
-        )
-        print(f"Trigger agent status: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Trigger agent test failed: {e}")
-        return False
+        await asyncio.gather(*(client.get("/health", timeout=5) for _ in range(connections)))
+    except httpx.HTTPError:
+        pass  # Warmup is best effort; real failures surface in the measured requests
 
-def test_autonomous_agent_endpoint():
-    """Test the autonomous trigger-agent endpoint (no policy)."""
-    test_payload = {
+def load_payload(i):
+    """Payload for load request `i`; each request carries a distinct event."""
+    return {
         "device_id": "device-001",
-        "event_details": "sensor_A_temperature_85_celsius_sustained_high_reading"
+        "event_details": LOAD_EVENT % i
     }
+
+async def run_load(client, total, concurrency, batch_size=1):
+    """Fire `total` trigger-agent events, at most `concurrency` requests at a time, and report latency.
     
-    try:
-        response = requests.post(
-            f"{BASE_URL}/trigger-agent",
-            json=test_payload,
-            headers={"Content-Type": "application/json"}
-        )
-        print(f"Autonomous agent status: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Autonomous agent test failed: {e}")
-        return False
+    With `batch_size` > 1 the events go to /trigger-agent-batch in chunks of
+    that size, and latencies are the server-side time of each event.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                # Only the status matters: drain the body in chunks without
+                # keeping it, so the connection goes straight back to the pool
+                async with client.stream("POST", "/trigger-agent", content=LOAD_BODY_TEMPLATE % i) as response:
+                    async for _ in response.aiter_bytes(65536):
+                        pass
+                    ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            return [(ok, time.perf_counter() - start)]
+    
+    async def batch(first):
+        events = [load_payload(i) for i in range(first, min(first + batch_size, total))]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/trigger-agent-batch",
+                    content=orjson.dumps({"events": events, "max_concurrency": len(events)}),
+                    # The server runs one event per device at a time, so a
+                    # batch for device-001 takes about as long as its events in series
+                    timeout=None
+                )
+                if response.status_code == 200:
+                    return [(item["success"], item["elapsed_time"]) for item in orjson.loads(response.content)["results"]]
+            except httpx.HTTPError:
+                pass
+            return [(False, time.perf_counter() - start)] * len(events)
+    
+    started = time.perf_counter()
+    if batch_size > 1:
+        chunks = await asyncio.gather(*(batch(first) for first in range(0, total, batch_size)))
+    else:
+        chunks = await asyncio.gather(*(one(i) for i in range(total)))
+    wall_time = time.perf_counter() - started
+    
+    results = [result for chunk in chunks for result in chunk]
+    latencies = [elapsed for _, elapsed in results]
+    succeeded = sum(1 for ok, _ in results if ok)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95 = cuts[49], cuts[94]
+    else:
+        p50 = p95 = latencies[0]
+    
+    print(f"Load test: {succeeded}/{total} succeeded in {wall_time:.2f}s "
+          f"(concurrency {concurrency}, batch size {batch_size})")
+    print(f"Latency p50: {p50:.2f}s  p95: {p95:.2f}s  max: {max(latencies):.2f}s")
+    return succeeded == total
 
-if __name__ == "__main__":
+async def main(args):
     print("Testing FastAPI endpoints...")
     print("Make sure the server is running first with: python run.py")
     print()
     
-    health_ok = test_health_endpoint()
-    print()
-    
-    if health_ok:
-        print("Testing Policy-Driven Mode:")
-        agent_ok = test_trigger_agent_endpoint()
-        print()
-        
-        print("Testing Autonomous Mode:")
-        autonomous_ok = test_autonomous_agent_endpoint()
-        print()
-        
-        if health_ok and agent_ok and autonomous_ok:
-            print("✅ All tests passed! Both policy-driven and autonomous modes work!")
+    # One pooled client for every test; agent runs routinely take 10-20s.
+    # With --http2 the requests multiplex over one connection, which needs an
+    # HTTP/2-capable front end (e.g. nginx or Caddy over TLS) before uvicorn.
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        http2=args.http2,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=120,
+        headers={"Content-Type": "application/json"}
+    ) as client:
+        if not await check_health(client):
+            passed, verdict = False, "❌ Health check failed, skipping agent tests"
+        elif args.load > 1:
+            print(f"Load testing /trigger-agent with {args.load} requests...")
+            total_requests = -(-args.load // args.batch_size) if args.batch_size > 1 else args.load
+            await warm_up(client, min(args.concurrency, total_requests))
+            passed = await run_load(client, args.load, args.concurrency, args.batch_size)
+            verdict = "✅ All load test requests succeeded" if passed else "❌ Some load test requests failed"
         else:
-            print("❌ Some tests failed")
-    else:
-        print("❌ Health check failed, skipping agent tests")
\ No newline at end of file
+            # The two modes are independent, so run them concurrently
+            print("Testing Policy-Driven and Autonomous Modes...")
+            await warm_up(client, 2)
+            passed = all(await asyncio.gather(
+                check_policy_mode(client),
+                check_autonomous_mode(client)
+            ))
+            verdict = ("✅ All tests passed! Both policy-driven and autonomous modes work!" if passed
+                       else "❌ Some tests failed")
+    
+    print()
+    print_report()
+    print(verdict)
+    return passed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test the OTA Agent API endpoints.")
+    parser.add_argument("--base-url", default=BASE_URL,
+                        help=f"server to test (default: {BASE_URL})")
+    parser.add_argument("--http2", action="store_true",
+                        help="negotiate HTTP/2 (needs an HTTP/2-capable proxy in front of the server)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print each result, with its response body, as it arrives")
+    parser.add_argument("--no-cache-health", action="store_true",
+                        help="re-run the health check every time instead of reusing a pass")
+    parser.add_argument("--load", type=int, default=1,
+                        help="send this many /trigger-agent requests and report latency")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="maximum in-flight requests in load mode")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="in load mode, send events to /trigger-agent-batch in chunks of this size (max 32)")
+    args = parser.parse_args()
+    if not 1 <= args.batch_size <= 32:
+        parser.error("--batch-size must be between 1 and 32")
+    CACHE_HEALTH = not args.no_cache_health
+    VERBOSE = args.verbose
+    sys.exit(0 if asyncio.run(main(args)) else 1)
\ No newline at end of file